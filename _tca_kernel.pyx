@@ -0,0 +1,45 @@
+# cython: language_level=3
+"""
+Ahead-of-time compiled evolution kernel for tca.py. Build it in place with
+
+    cythonize -i _tca_kernel.pyx
+
+tca.py uses it when it can be imported and falls back to the numba
+kernel otherwise, avoiding the JIT warm-up on first use.
+"""
+
+cimport cython
+from libc.stdint cimport uint8_t
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def evolve(uint8_t[:, ::1] field, const uint8_t[::1] lut):
+
+    """
+    Evolves a spacetime field in place. Row 0 must hold the initial
+    condition; every later row is overwritten.
+
+    Parameters
+    ----------
+    field: np.ndarray
+        Preallocated C-contiguous uint8 array of shape
+        (time_steps+1, length)
+    lut: np.ndarray
+        Flat uint8 lookup array, indexed by 3*left + center
+    """
+
+    cdef Py_ssize_t T1 = field.shape[0]
+    cdef Py_ssize_t N = field.shape[1]
+    cdef Py_ssize_t t, i
+    cdef uint8_t left, c
+
+    if N == 0:
+        return
+    with nogil:
+        for t in range(1, T1):
+            left = field[t-1, N-1]
+            for i in range(N):
+                c = field[t-1, i]
+                field[t, i] = lut[3*left + c]
+                left = c
@@ -1,7 +1,20 @@
-import random
+import functools
+import operator
+import os
+import tempfile
 
 import matplotlib.pyplot as plt
-from numpy import array_equal
+import numpy as np
+from numba import njit, prange
+
+# powers of 3 for the nine trinary digits of a rule number
+_POW3 = tuple(3**i for i in range(9))
+
+_RNG = np.random.default_rng()
+
+# place values of the five cells packed into one byte,
+# see pack_configuration
+_PACK_POW3 = np.array(_POW3[:5], dtype=np.uint8)
 
 
 def random_string(length):
@@ -17,13 +30,409 @@ def random_string(length):
 
     Returns
     -------
-    out: list
-        The random  string given as a list, with int elements.
+    out: np.ndarray
+        The random  string given as a uint8 array.
     """
 
     if not isinstance(length, int) or length < 0:
         raise ValueError("input length must be a positive ingeter")
-    return [random.randint(0,2) for _ in range(length)]
+    return _RNG.integers(0, 3, size=length, dtype=np.uint8)
+
+
+def pack_configuration(configuration):
+
+    """
+    Packs configurations five cells to a byte, as the base-3 number
+    c0 + 3*c1 + 9*c2 + 27*c3 + 81*c4. This stores a configuration in
+    a fifth of the memory of a uint8 array.
+
+    Parameters
+    ----------
+    configuration: np.ndarray or list
+        Array of 0s, 1s, and 2s; any other value raises a ValueError.
+        If 2D, each row is packed separately. The last byte of a row
+        is padded with 0s when the length is not a multiple of 5.
+
+    Returns
+    -------
+    out: np.ndarray
+        uint8 array whose last dimension has length ceil(length/5)
+    """
+
+    configuration = _check_configuration(configuration)
+    length = configuration.shape[-1]
+    padded = np.zeros(configuration.shape[:-1] + (-(-length // 5) * 5,),
+                      dtype=np.uint8)
+    padded[..., :length] = configuration
+    cells = padded.reshape(padded.shape[:-1] + (-1, 5))
+    return (cells * _PACK_POW3).sum(axis=-1, dtype=np.uint8)
+
+
+def unpack_configuration(packed, length):
+
+    """
+    Reverses pack_configuration.
+
+    Parameters
+    ----------
+    packed: np.ndarray
+        uint8 array of packed configurations, as returned by
+        pack_configuration or TCA.spacetime_field_packed
+    length: int
+        Number of cells in each unpacked configuration
+
+    Returns
+    -------
+    out: np.ndarray
+        uint8 array whose last dimension has the given length
+    """
+
+    packed = np.asarray(packed, dtype=np.uint8)
+    cells = packed[..., np.newaxis] // _PACK_POW3 % 3
+    return cells.reshape(packed.shape[:-1] + (-1,))[..., :length]
+
+
+@functools.lru_cache(maxsize=None)
+def _build_lut(rule_number):
+
+    """
+    Returns the lookup table of a rule number as a tuple of 9 ints,
+    where the output of the neighborhood (left, center) is found at
+    index 3*left + center. Cached, since rule sweeps construct
+    the same rules over and over.
+    """
+
+    lut = []
+    for _ in range(9):
+        rule_number, out = divmod(rule_number, 3)
+        lut.append(out)
+    return tuple(lut)
+
+
+@njit(cache=True)
+def _evolve(field, lut):
+
+    """
+    Evolves a spacetime field in place. Row 0 must hold the initial
+    condition; every later row is overwritten.
+
+    Parameters
+    ----------
+    field: np.ndarray
+        Preallocated uint8 array of shape (time_steps+1, length)
+    lut: np.ndarray
+        Flat uint8 lookup array, indexed by 3*left + center
+    """
+
+    T1, N = field.shape
+    if N == 0:
+        return
+
+    # the left neighbor of cell 0 is the last cell. It is read once per
+    # row and then carried along, so no index ever wraps around
+    for t in range(1, T1):
+        prev = field[t-1]
+        left = prev[N-1]
+        for i in range(N):
+            c = prev[i]
+            field[t, i] = lut[3*left + c]
+            left = c
+
+
+try:
+    # optional ahead-of-time compiled kernel with the same signature,
+    # see _tca_kernel.pyx. It only skips compiling _evolve on first
+    # use; numba is still imported for the other kernels.
+    from _tca_kernel import evolve as _evolve_field
+except ImportError:
+    _evolve_field = _evolve
+
+
+def _is_constant_rule(lut):
+
+    """
+    Returns whether every neighborhood of the lookup table, given as
+    a tuple, maps to the same output (e.g. rules 0, 9841 and 19682).
+    """
+
+    return len(set(lut)) == 1
+
+
+@njit(cache=True, parallel=True)
+def _evolve_batch(fields, lut):
+
+    """
+    Evolves a batch of independent spacetime fields in place, one
+    per thread. Row 0 of each field must hold its initial condition.
+
+    Parameters
+    ----------
+    fields: np.ndarray
+        Preallocated uint8 array of shape (batch, time_steps+1, length)
+    lut: np.ndarray
+        Flat uint8 lookup array, indexed by 3*left + center
+    """
+
+    for b in prange(fields.shape[0]):
+        _evolve(fields[b], lut)
+
+
+@njit(cache=True)
+def _pair_table(lut):
+
+    """
+    Returns a 256-entry table mapping a byte holding two neighborhood
+    indices (one per nibble) to a byte holding the two outputs.
+    """
+
+    pairs = np.zeros(256, dtype=np.uint64)
+    for hi in range(9):
+        for lo in range(9):
+            pairs[16*hi + lo] = lut[lo] | (np.uint64(lut[hi]) << np.uint64(4))
+    return pairs
+
+
+@njit(cache=True)
+def _evolve_packed(configuration, lut, time_steps):
+
+    """
+    Evolves a single configuration for the given number of time steps
+    and returns the final configuration. Cells are packed 16 to a
+    uint64 word (cell i in nibble i % 16 of word i // 16), so the
+    neighborhood indices 3*left + center of a whole word are computed
+    with one shift, multiply and add. The outputs are then gathered a
+    byte (two cells) at a time from a pair table.
+
+    Parameters
+    ----------
+    configuration: np.ndarray
+        uint8 array holding the initial configuration. Must not be empty.
+    lut: np.ndarray
+        Flat uint8 lookup array, indexed by 3*left + center
+    time_steps: int
+        Number of time steps to evolve for
+    """
+
+    N = configuration.shape[0]
+    M = (N + 15) // 16
+    pairs = _pair_table(lut)
+    words = np.zeros(M, dtype=np.uint64)
+    new_words = np.empty(M, dtype=np.uint64)
+    for i in range(N):
+        shift = np.uint64(4 * (i % 16))
+        words[i // 16] |= np.uint64(configuration[i]) << shift
+
+    # the last cell sits in nibble `top` of the last word; the
+    # nibbles above it are padding and are kept at zero by `mask`
+    top = np.uint64(4 * ((N - 1) % 16))
+    mask = np.uint64(0xFFFFFFFFFFFFFFFF) >> np.uint64(60 - top)
+
+    for _ in range(time_steps):
+        carry = (words[M-1] >> top) & np.uint64(0xF)
+        for j in range(M):
+            word = words[j]
+            left = (word << np.uint64(4)) | carry
+            carry = word >> np.uint64(60)
+            idx = left * np.uint64(3) + word
+            out = np.uint64(0)
+            for k in range(8):
+                shift = np.uint64(8 * k)
+                out |= pairs[(idx >> shift) & np.uint64(0xFF)] << shift
+            new_words[j] = out
+        new_words[M-1] &= mask
+        words, new_words = new_words, words
+
+    final = np.empty(N, dtype=np.uint8)
+    for i in range(N):
+        final[i] = (words[i // 16] >> np.uint64(4 * (i % 16))) & np.uint64(0xF)
+    return final
+
+
+@njit(cache=True)
+def _byte_table(lut):
+
+    """
+    Returns a 729-entry table mapping 243*left + byte, where byte holds
+    five packed cells and left is the cell to their left, to the byte
+    holding the five outputs.
+    """
+
+    table = np.empty(729, dtype=np.uint8)
+    for left in range(3):
+        for byte in range(243):
+            l = left
+            rest = byte
+            out = 0
+            place = 1
+            for _ in range(5):
+                c = rest % 3
+                rest //= 3
+                out += lut[3*l + c] * place
+                place *= 3
+                l = c
+            table[243*left + byte] = out
+    return table
+
+
+@njit(cache=True)
+def _evolve_base3(field, lut, length):
+
+    """
+    Evolves a packed spacetime field in place, one byte (five cells)
+    at a time. Row 0 must hold the packed initial condition.
+
+    Parameters
+    ----------
+    field: np.ndarray
+        Preallocated uint8 array of shape (time_steps+1, ceil(length/5)),
+        with rows packed as in pack_configuration
+    lut: np.ndarray
+        Flat uint8 lookup array, indexed by 3*left + center
+    length: int
+        Number of cells in a configuration. Must be positive.
+    """
+
+    table = _byte_table(lut)
+    T1, M = field.shape
+
+    # the last byte holds `tail` cells; the rest is padding,
+    # which is kept at zero by reducing modulo 3**tail
+    tail = length - 5*(M-1)
+    tail_mod = 3**tail
+    last_place = 3**(tail-1)
+
+    for t in range(1, T1):
+        prev = field[t-1]
+        left = (prev[M-1] // last_place) % 3
+        for j in range(M):
+            byte = prev[j]
+            field[t, j] = table[243*left + byte]
+            left = byte // 81
+        field[t, M-1] %= tail_mod
+
+
+@njit(cache=True)
+def _evolve_final(configuration, scratch, lut, time_steps):
+
+    """
+    Evolves a non-empty configuration in place for the given number of
+    time steps, alternating between it and a scratch row of the same
+    length so that only two rows are ever stored.
+    """
+
+    N = configuration.shape[0]
+    current, new = configuration, scratch
+    for _ in range(time_steps):
+        left = current[N-1]
+        for i in range(N):
+            c = current[i]
+            new[i] = lut[3*left + c]
+            left = c
+        current, new = new, current
+    if time_steps % 2:
+        for i in range(N):
+            configuration[i] = scratch[i]
+
+
+@njit(cache=True, parallel=True)
+def _survey_cpu(configurations, scratch, luts, time_steps):
+
+    """
+    Evolves a batch of independent configurations in place, one
+    per thread, each with its own lookup table.
+
+    Parameters
+    ----------
+    configurations: np.ndarray
+        uint8 array of shape (batch, length) holding the initial
+        conditions; overwritten with the final configurations
+    scratch: np.ndarray
+        uint8 array of the same shape, used as the second row
+    luts: np.ndarray
+        uint8 array of shape (batch, 9) of flat lookup arrays
+    time_steps: int
+        Number of time steps to evolve for
+    """
+
+    for b in prange(configurations.shape[0]):
+        _evolve_final(configurations[b], scratch[b], luts[b], time_steps)
+
+
+@functools.lru_cache(maxsize=None)
+def _survey_gpu():
+
+    """
+    Returns the CUDA kernel used by survey, evolving one trajectory per
+    thread. numba.cuda is only imported here, so that importing this
+    module does not pay for it.
+    """
+
+    from numba import cuda
+
+    @cuda.jit
+    def _survey_kernel(configurations, scratch, luts, time_steps):
+        b = cuda.grid(1)
+        if b < configurations.shape[0]:
+            _evolve_final(configurations[b], scratch[b], luts[b], time_steps)
+
+    return _survey_kernel
+
+
+def _check_inputs(initial_condition, time_steps):
+
+    """
+    Validates the inputs to an evolution and returns them as
+    a uint8 array and an int, respectively.
+    """
+
+    if time_steps < 0:
+        raise ValueError("time_steps must be a non-negative integer")
+    try:
+        time_steps = int(time_steps)
+    except ValueError:
+        raise ValueError("time_steps must be a non-negative integer")
+
+    return _check_configuration(initial_condition), time_steps
+
+
+def _check_configuration(configuration):
+
+    """
+    Validates that a configuration (or an array of them) holds only
+    0s, 1s, and 2s and returns it as a contiguous uint8 array.
+    """
+
+    # uint8 arrays (e.g. from random_string) cannot be negative, so
+    # only the maximum needs checking; anything else is compared
+    # against the allowed values before it is cast
+    if (isinstance(configuration, np.ndarray)
+       and configuration.dtype == np.uint8):
+        invalid = configuration.max(initial=0) > 2
+    else:
+        configuration = np.asarray(configuration)
+        invalid = not np.isin(configuration, (0,1,2)).all()
+    if invalid:
+        raise ValueError("configuration must contain only " \
+                         "0s, 1s, and 2s")
+
+    return np.ascontiguousarray(configuration, dtype=np.uint8)
+
+
+def _check_out(out, shape):
+
+    """
+    Returns a preallocated output array of the given shape, or checks
+    that a user supplied one (e.g. an np.memmap) can be written into.
+    """
+
+    if out is None:
+        return np.empty(shape, dtype=np.uint8)
+    if (not isinstance(out, np.ndarray)
+       or out.shape != shape or out.dtype != np.uint8
+       or not out.flags.c_contiguous):
+        raise ValueError("out must be a C-contiguous uint8 array " \
+                         "of shape {}".format(shape))
+    return out
 
 
 class TCA:
@@ -43,14 +452,15 @@ class TCA:
             Specifies the rules under which the automata evolves
         rule_number_trinary: string
             rule_number represented in base 3
-        lookup:
+        lookup_arr: np.ndarray
             A lookup table for evolving the cellular automata
-            as specified by the rule number
+            as specified by the rule number, as a flat uint8 array
+            indexed by 3*left + center
         '''
 
         self.rule_number = rule_number
         self.rule_number_trinary = self.to_trinary(rule_number)
-        self.lookup = self.lookup_table()
+        self.lookup_arr = self.lookup_table()
 
     def update_rule(self,rule_number):
 
@@ -69,7 +479,7 @@ class TCA:
 
         self.rule_number = rule_number
         self.rule_number_trinary = self.to_trinary(rule_number)
-        self.lookup = self.lookup_table()
+        self.lookup_arr = self.lookup_table()
 
 
     def to_trinary(self, rule_number):
@@ -94,19 +504,17 @@ class TCA:
             raise ValueError("rule_number must be an int " \
                              "between 0  and 19682, inclusive")
 
-        in_trinary = ''
+        digits = []
         tmp = rule_number
-        for i in range(8, -1, -1):
-            factor = int(pow(3,i))
-            val = tmp // factor
-            in_trinary += str(val)
-            tmp -= factor*val
-        return(in_trinary)
+        for factor in reversed(_POW3):
+            val, tmp = divmod(tmp, factor)
+            digits.append(val)
+        return ''.join(map(str, digits))
 
     def lookup_table(self):
 
         """
-        Returns a dictionary which maps ECA neighborhoods to output values.
+        Returns an array which maps ECA neighborhoods to output values.
         Uses Wolfram rule number convention.
 
         Parameters
@@ -115,21 +523,16 @@ class TCA:
 
         Returns
         -------
-        lookup_table: dict
-            Lookup table dictionary that maps neighborhood tuples to
-            their output according to the ECA local evolution rule
-            (i.e. the lookup table), as specified by the rule number.
+        lookup_table: np.ndarray
+            Flat uint8 array of length 9. The output of the neighborhood
+            (left, center) according to the ECA local evolution rule
+            (i.e. the lookup table), as specified by the rule number,
+            is found at index 3*left + center.
         """
 
-        neighborhoods = [(0,0), (0,1), (0,2), (1,0), (1,1),
-                         (1,2), (2,0), (2,1), (2,2)]
-
-        return dict(zip(neighborhoods,
-                    map(int,reversed(self.rule_number_trinary))))
-        # use map so that outputs are ints, not strings
+        return np.asarray(_build_lut(self.rule_number), dtype=np.uint8)
 
-
-    def spacetime_field(self, initial_condition, time_steps):
+    def spacetime_field(self, initial_condition, time_steps, out=None):
 
         """
 
@@ -138,54 +541,158 @@ class TCA:
 
         Parameters
         ----------
-        initial_condition: list
-            Trinary string used as the initial condition for the ECA.
-            Elements of the list should be ints.
+        initial_condition: np.ndarray or list
+            Trinary string used as the initial condition for the ECA,
+            ideally as a uint8 array such as returned by random_string.
+            Lists of ints are converted.
         time_steps: int
             Positive integer specifying
             the number of time steps for evolving the ECA.
+        out: np.ndarray, optional
+            Preallocated C-contiguous uint8 array of shape
+            (time_steps+1, len(initial_condition)) to write the field
+            into, e.g. an np.memmap so that runs too large for memory
+            are written to disk as they are computed.
 
         Returns:
             Spacetime field consisting of initial conditions evolved
-            for the given number of time steps
+            for the given number of time steps, as a 2D uint8 array
+            of shape (time_steps+1, len(initial_condition))
 
         """
 
+        initial_condition, time_steps = _check_inputs(initial_condition,
+                                                      time_steps)
 
-        if time_steps < 0:
-            raise ValueError("time_steps must be a non-negative integer")
-        try:
-            time_steps = int(time_steps)
-        except ValueError:
-            raise ValueError("time_steps must be a non-negative integer")
-
-        for i in initial_condition:
-            if i not in [0,1,2]:
-                raise ValueError("initial condition must be a " \
-                                "list of 0s, 1s, and 2s")
-
-        # initialize spacetime field and current configuration
-        spacetime_field = [initial_condition]
-        current_configuration = initial_condition.copy()
-        length = len(current_configuration)
+        # initialize spacetime field
+        length = len(initial_condition)
+        spacetime_field = _check_out(out, (time_steps+1, length))
+        spacetime_field[0] = initial_condition
 
         # apply the lookup table to evolve the CA
         # for the given number of time steps
+        lut = _build_lut(self.rule_number)
+        if _is_constant_rule(lut):
+            # every row after the first is the rule's single output
+            spacetime_field[1:] = lut[0]
+        else:
+            _evolve_field(spacetime_field, self.lookup_arr)
 
-        for _ in range(time_steps):
-            new_configuration = []
+        return spacetime_field
+
+    def spacetime_field_batch(self, initial_conditions, time_steps):
+
+        """
+        Returns the spacetime fields for several initial conditions of
+        the same length, evolved in parallel using the given rule number.
+
+        Parameters
+        ----------
+        initial_conditions: array-like (2D)
+            Trinary strings used as initial conditions for the ECA,
+            given as a 2D array or list of lists. initial_conditions[b]
+            is the initial condition of the b-th field.
+        time_steps: int
+            Positive integer specifying
+            the number of time steps for evolving the ECA.
+
+        Returns:
+            Spacetime fields as a 3D uint8 array of shape
+            (batch, time_steps+1, length), so that the result at
+            index b equals spacetime_field(initial_conditions[b], time_steps)
+
+        """
 
-            for i in range(length):
-                neighborhood = (current_configuration[(i-1)],
-                                current_configuration[i])
-                new_configuration.append(self.lookup[neighborhood])
+        initial_conditions = np.asarray(initial_conditions)
+        if initial_conditions.ndim != 2:
+            raise ValueError("initial conditions must be a 2D array " \
+                             "or list of lists of equal length")
+        batch, length = initial_conditions.shape
+        initial_conditions, time_steps = _check_inputs(
+            initial_conditions.ravel(), time_steps)
 
-            current_configuration = new_configuration
-            spacetime_field.append(new_configuration)
+        fields = np.empty((batch, time_steps+1, length), dtype=np.uint8)
+        fields[:, 0] = initial_conditions.reshape(batch, length)
+        _evolve_batch(fields, self.lookup_arr)
+
+        return fields
+
+    def spacetime_field_packed(self, initial_condition, time_steps, out=None):
+
+        """
+        Returns the same spacetime field as spacetime_field, but with
+        each configuration packed five cells to a byte as in
+        pack_configuration. The field takes a fifth of the memory,
+        which makes very wide or long runs feasible, and is evolved
+        a byte at a time.
+
+        Parameters
+        ----------
+        initial_condition: np.ndarray or list
+            Trinary string used as the initial condition for the ECA,
+            ideally as a uint8 array such as returned by random_string.
+            Lists of ints are converted.
+        time_steps: int
+            Positive integer specifying
+            the number of time steps for evolving the ECA.
+        out: np.ndarray, optional
+            Preallocated C-contiguous uint8 array of shape
+            (time_steps+1, ceil(len(initial_condition)/5)) to write the
+            field into, e.g. an np.memmap so that runs too large for
+            memory are written to disk as they are computed.
+
+        Returns:
+            Packed spacetime field as a 2D uint8 array of shape
+            (time_steps+1, ceil(len(initial_condition)/5)). Use
+            unpack_configuration to recover the cells.
+
+        """
+
+        initial_condition, time_steps = _check_inputs(initial_condition,
+                                                      time_steps)
+
+        length = len(initial_condition)
+        packed = pack_configuration(initial_condition)
+        spacetime_field = _check_out(out, (time_steps+1, len(packed)))
+        spacetime_field[0] = packed
+        if length:
+            _evolve_base3(spacetime_field, self.lookup_arr, length)
 
         return spacetime_field
 
-    def spacetime_diagram(self, spacetime_field, size=12, colors=plt.cm.Greys):
+    def final_configuration(self, initial_condition, time_steps):
+
+        """
+        Returns only the configuration reached after evolving the given
+        initial condition for the given number of time steps. The full
+        spacetime field is never stored, and cells are evolved 16 at a
+        time, so this is the faster choice for long runs on wide
+        configurations when only the end state is needed.
+
+        Parameters
+        ----------
+        initial_condition: np.ndarray or list
+            Trinary string used as the initial condition for the ECA,
+            ideally as a uint8 array such as returned by random_string.
+            Lists of ints are converted.
+        time_steps: int
+            Positive integer specifying
+            the number of time steps for evolving the ECA.
+
+        Returns:
+            Final configuration as a 1D uint8 array, equal to
+            spacetime_field(initial_condition, time_steps)[-1]
+
+        """
+
+        initial_condition, time_steps = _check_inputs(initial_condition,
+                                                      time_steps)
+        if len(initial_condition) == 0:
+            return initial_condition
+        return _evolve_packed(initial_condition, self.lookup_arr, time_steps)
+
+    def spacetime_diagram(self, spacetime_field, size=12, colors=plt.cm.Greys,
+                          show=True):
 
         """
         Produces a simple spacetime diagram image using matplotlib
@@ -193,10 +700,11 @@ class TCA:
 
        Parameters
         ---------
-        spacetime_field: array-like (2D)
-            1+1 dimensional spacetime field, given as a 2D array
-            or list of lists. Time should be dimension 0 so that
-            spacetime_field[t] is the spatial configuration at time t.
+        spacetime_field: np.ndarray (2D)
+            1+1 dimensional spacetime field, as returned by
+            spacetime_field. Lists of lists are also accepted.
+            Time should be dimension 0 so that spacetime_field[t]
+            is the spatial configuration at time t.
 
         size: int, optional (default=12)
             Sets the size of the figure: figsize=(size,size)
@@ -204,14 +712,21 @@ class TCA:
             See https://matplotlib.org/tutorials/colors/colormaps.html
             for colormap choices. A colormap 'cmap' is called as
             colors=plt.cm.cmap
+        show: bool, optional (default=True)
+            Whether to call plt.show(). Pass False when running headless
+            or when the figure is saved or modified afterwards.
 
         """
 
         plt.figure(figsize=(size,size))
-        plt.imshow(spacetime_field, cmap=colors, interpolation='nearest', origin='lower')
-        plt.show()
+        # fixing vmin and vmax maps 0, 1, 2 to the same colors
+        # in every diagram and spares imshow a scan of the data
+        plt.imshow(spacetime_field, cmap=colors, interpolation='nearest',
+                   origin='lower', vmin=0, vmax=2)
+        if show:
+            plt.show()
 
-    def simulate(self, initial_conditions, time_steps, figsize=12):
+    def simulate(self, initial_conditions, time_steps, figsize=12, show=True):
 
         """
         Run the cellular automata for a given number of time steps starting
@@ -219,60 +734,312 @@ class TCA:
 
         Parameters
         ----------
-        initial_conditions: list
-            Trinary string used as the initial condition for the ECA.
-            Elements of the list should be ints.
+        initial_conditions: np.ndarray or list
+            Trinary string used as the initial condition for the ECA,
+            ideally as a uint8 array such as returned by random_string.
+            Lists of ints are converted.
         time_steps: int
             Positive integer indicating number of time steps
 
         figsize: int
             size of the resultant figure
+        show: bool
+            Whether to call plt.show() on the resultant figure
 
         """
 
         field = self.spacetime_field(initial_conditions, time_steps)
-        self.spacetime_diagram(field, figsize)
+        self.spacetime_diagram(field, figsize, show=show)
+
+
+def survey(rule_numbers, initial_conditions, time_steps, gpu=False):
+
+    """
+    Evolves many (rule number, initial condition) pairs at once and
+    returns only their final configurations, e.g. for surveys over all
+    rules. Each pair is an independent trajectory, evolved by a
+    parallel CPU loop or, if requested, by its own GPU thread.
+    Only two rows per trajectory are stored.
+
+    Parameters
+    ----------
+    rule_numbers: array-like (1D)
+        Integer values between 0 and 19682, inclusive.
+        rule_numbers[b] is the rule used to evolve initial_conditions[b]
+    initial_conditions: array-like (2D)
+        Trinary strings used as initial conditions for the ECA,
+        given as a 2D array or list of lists of equal length.
+    time_steps: int
+        Positive integer specifying
+        the number of time steps for evolving the ECA.
+    gpu: bool, optional (default=False)
+        Whether to run on a CUDA device, one thread per trajectory.
+        Requires numba to find a CUDA device.
+
+    Returns
+    -------
+    out: np.ndarray
+        Final configurations as a 2D uint8 array of shape
+        (batch, length), so that out[b] equals
+        TCA(rule_numbers[b]).final_configuration(initial_conditions[b],
+                                                 time_steps)
+    """
+
+    initial_conditions = np.asarray(initial_conditions)
+    if initial_conditions.ndim != 2:
+        raise ValueError("initial conditions must be a 2D array " \
+                         "or list of lists of equal length")
+    batch, length = initial_conditions.shape
+    if len(rule_numbers) != batch:
+        raise ValueError("there must be one rule number per initial condition")
+    initial_conditions, time_steps = _check_inputs(
+        initial_conditions.ravel(), time_steps)
+    configurations = initial_conditions.reshape(batch, length)
+    # operator.index accepts NumPy integers but, unlike int, rejects
+    # floats instead of truncating them
+    try:
+        rule_numbers = [operator.index(r) for r in rule_numbers]
+    except TypeError:
+        raise ValueError("rule_number must be an int " \
+                         "between 0  and 19682, inclusive")
+    luts = np.array([TCA(r).lookup_arr for r in rule_numbers],
+                    dtype=np.uint8).reshape(batch, 9)
+
+    if batch == 0 or length == 0:
+        return configurations
+    if gpu:
+        from numba import cuda
+        d_configurations = cuda.to_device(configurations)
+        d_scratch = cuda.device_array_like(configurations)
+        threads = 256
+        blocks = (batch + threads - 1) // threads
+        _survey_gpu()[blocks, threads](d_configurations, d_scratch,
+                                     cuda.to_device(luts), time_steps)
+        return d_configurations.copy_to_host()
+
+    configurations = configurations.copy()
+    _survey_cpu(configurations, np.empty_like(configurations), luts,
+                time_steps)
+    return configurations
+
 
 def test_rule0():
     tca = TCA()
-    expected_out = [0 for i in range(10)]
+    expected_out = np.zeros((2, 10), dtype=np.uint8)
     initial = random_string(10)
     field = tca.spacetime_field(initial, 2)
 
-    for t, config in enumerate(field[1:]):
-        assert array_equal(config, expected_out), \
-        "Rule 0 test failed. Configuration after {} steps incorrect".format(t)
+    assert np.array_equal(field[1:], expected_out), \
+    "Rule 0 test failed. Configurations after 1 and 2 steps incorrect"
 
     print("Rule 0 test passed")
 
 def test_rule9841():
     tca = TCA(9841)
-    expected_out = [1 for i in range(10)]
+    expected_out = np.ones((2, 10), dtype=np.uint8)
     initial = random_string(10)
     field = tca.spacetime_field(initial, 2)
 
-    for t, config in enumerate(field[1:]):
-        assert array_equal(config, expected_out), \
-        "Rule 9841 test failed. Configuration after {} steps incorrect".format(t)
+    assert np.array_equal(field[1:], expected_out), \
+    "Rule 9841 test failed. Configurations after 1 and 2 steps incorrect"
 
     print("Rule 9841 test passed")
 
 def test_rule19682():
     tca = TCA(19682)
-    expected_out = [2 for i in range(10)]
+    expected_out = np.full((2, 10), 2, dtype=np.uint8)
     initial = random_string(10)
     field = tca.spacetime_field(initial, 2)
 
-    for t, config in enumerate(field[1:]):
-        assert array_equal(config, expected_out), \
-        "Rule 19682 test failed. Configuration after {} steps incorrect".format(t)
+    assert np.array_equal(field[1:], expected_out), \
+    "Rule 19682 test failed. Configurations after 1 and 2 steps incorrect"
 
     print("Rule 19682 test passed")
 
 
+def test_evolve_matches_lookup():
+    tca = TCA(1234)
+    initial = random_string(20)
+    field = tca.spacetime_field(initial, 5)
+    assert field.dtype == np.uint8 and field.nbytes == 6*20, \
+        "Evolution test failed. Spacetime field is not stored as uint8"
+
+    for t in range(5):
+        prev = [int(c) for c in field[t]]
+        expected_out = [int(tca.rule_number_trinary[8 - 3*prev[i-1] - prev[i]])
+                        for i in range(20)]
+        assert np.array_equal(field[t+1], expected_out), \
+        "Evolution test failed. Configuration after {} steps incorrect".format(t+1)
+
+    print("Evolution test passed")
+
+def test_constant_rules():
+    initial = random_string(20)
+    for rule_number in [0, 9841, 19682, 1234, 777]:
+        tca = TCA(rule_number)
+        field = tca.spacetime_field(initial, 5)
+        expected_out = np.empty((6, 20), dtype=np.uint8)
+        expected_out[0] = initial
+        _evolve(expected_out, tca.lookup_arr)
+        assert np.array_equal(field, expected_out), \
+        "Constant rule test failed for rule {}".format(rule_number)
+
+    print("Constant rule test passed")
+
+
+def test_compiled_kernel():
+    if _evolve_field is _evolve:
+        print("Compiled kernel test skipped, _tca_kernel is not built")
+        return
+
+    tca = TCA(1234)
+    for length in [1, 2, 50]:
+        field = np.empty((11, length), dtype=np.uint8)
+        field[0] = random_string(length)
+        expected_out = field.copy()
+        _evolve_field(field, tca.lookup_arr)
+        _evolve(expected_out, tca.lookup_arr)
+        assert np.array_equal(field, expected_out), \
+        "Compiled kernel test failed for length {}".format(length)
+
+    print("Compiled kernel test passed")
+
+
+def test_final_configuration():
+    tca = TCA(1234)
+    for length in [1, 15, 16, 17, 100]:
+        initial = random_string(length)
+        field = tca.spacetime_field(initial, 10)
+        final = tca.final_configuration(initial, 10)
+        assert np.array_equal(final, field[-1]), \
+        "Final configuration test failed for length {}".format(length)
+
+    print("Final configuration test passed")
+
+def test_spacetime_field_packed():
+    tca = TCA(1234)
+    for length in [1, 4, 5, 6, 23]:
+        initial = random_string(length)
+        packed = tca.spacetime_field_packed(initial, 10)
+        assert np.array_equal(unpack_configuration(packed, length),
+                              tca.spacetime_field(initial, 10)), \
+        "Packed field test failed for length {}".format(length)
+
+    try:
+        pack_configuration([3, 3, 3, 3, 3])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Packing accepted an invalid configuration")
+
+    print("Packed field test passed")
+
+
+def test_spacetime_field_out():
+    tca = TCA(1234)
+    initial = random_string(10)
+    with tempfile.TemporaryDirectory() as directory:
+        out = np.memmap(os.path.join(directory, "field.dat"), dtype=np.uint8,
+                        mode="w+", shape=(6, 10))
+        field = tca.spacetime_field(initial, 5, out=out)
+        expected_out = tca.spacetime_field(initial, 5)
+        assert field is out and np.array_equal(out, expected_out), \
+        "Output array test failed"
+        del field, out
+
+    try:
+        tca.spacetime_field(initial, 5, out=[[0]*10]*6)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("A list was accepted as the output array")
+
+    print("Output array test passed")
+
+
+def test_spacetime_field_batch():
+    tca = TCA(1234)
+    initials = [random_string(10) for _ in range(4)]
+    fields = tca.spacetime_field_batch(initials, 5)
+
+    for b, initial in enumerate(initials):
+        assert np.array_equal(fields[b], tca.spacetime_field(initial, 5)), \
+        "Batch test failed. Field {} incorrect".format(b)
+
+    print("Batch test passed")
+
+def test_invalid_initial_condition():
+    tca = TCA()
+    for initial in [[0, 1, 3], [-1, 0], [0.5], np.array([0, 7], dtype=np.uint8)]:
+        try:
+            tca.spacetime_field(initial, 2)
+        except ValueError:
+            continue
+        raise AssertionError("Invalid initial condition {} was accepted".format(initial))
+
+    print("Invalid initial condition test passed")
+
+
+def test_survey():
+    rule_numbers = [0, 1234, 9841, 777]
+    initials = [random_string(10) for _ in range(4)]
+    finals = survey(rule_numbers, initials, 5, gpu=False)
+
+    for b, (rule_number, initial) in enumerate(zip(rule_numbers, initials)):
+        expected_out = TCA(rule_number).spacetime_field(initial, 5)[-1]
+        assert np.array_equal(finals[b], expected_out), \
+        "Survey test failed. Final configuration {} incorrect".format(b)
+
+    try:
+        survey([1.7], [[0, 1]], 1, gpu=False)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Survey accepted a non-integer rule number")
+
+    print("Survey test passed")
+
+
+def test_empty_initial_condition():
+    tca = TCA(9841)
+    assert tca.spacetime_field([], 3).shape == (4, 0), \
+    "Empty initial condition test failed"
+    assert TCA(1234).spacetime_field([], 3).shape == (4, 0), \
+    "Empty initial condition test failed for non-constant rules"
+    assert tca.spacetime_field_batch(np.empty((2, 0)), 3).shape == (2, 4, 0), \
+    "Empty initial condition test failed for batches"
+
+    print("Empty initial condition test passed")
+
+
+def test_survey_gpu():
+    from numba import cuda
+    if not cuda.is_available():
+        print("GPU survey test skipped, no CUDA device")
+        return
+
+    rule_numbers = [0, 1234, 9841, 777]
+    initials = [random_string(10) for _ in range(4)]
+    finals = survey(rule_numbers, initials, 5, gpu=True)
+
+    assert np.array_equal(finals, survey(rule_numbers, initials, 5, gpu=False)), \
+    "GPU survey test failed"
+
+    print("GPU survey test passed")
 
 
 if __name__ == "__main__":
     test_rule0()
     test_rule9841()
-    test_rule19682() 
\ No newline at end of file
+    test_rule19682()
+    test_evolve_matches_lookup()
+    test_constant_rules()
+    test_compiled_kernel()
+    test_final_configuration()
+    test_spacetime_field_packed()
+    test_spacetime_field_out()
+    test_spacetime_field_batch()
+    test_survey()
+    test_survey_gpu()
+    test_invalid_initial_condition()
+    test_empty_initial_condition()